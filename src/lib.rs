@@ -1,7 +1,9 @@
 use anyhow::{Context, Result};
 use globset::{GlobBuilder, GlobSet, GlobSetBuilder};
 use serde::{Deserialize, Serialize};
-use std::collections::HashMap;
+use std::borrow::Cow;
+use std::collections::{BTreeMap, HashMap, HashSet};
+use std::fmt::Write as _;
 use std::fs;
 use std::path::Path;
 
@@ -35,19 +37,31 @@ pub struct Contact {
     pub email: Option<String>,
 }
 
+impl ServicesFile {
+    pub fn from_file(path: &Path) -> Result<Self> {
+        let content = fs::read_to_string(path)
+            .with_context(|| format!("Failed to read services file at {:?}", path))?;
+        serde_yaml::from_str(&content)
+            .with_context(|| format!("Invalid services file at {:?}", path))
+    }
+}
+
 /// A match explanation
 #[derive(Debug)]
 pub struct ExplainMatch<'a> {
     pub service: &'a str,
-    pub pattern: String,
+    pub pattern: &'a str,
 }
 
 /// Core mapper that resolves paths to services
 pub struct ServiceMapper {
     glob_set: GlobSet,
-    /// Maps glob index to service name
+    /// Rule indices behind each glob when several rules normalize to the
+    /// same glob (`foo` and `./foo`); `None` when every glob is its own rule
+    shared_globs: Option<Vec<Vec<usize>>>,
+    /// Maps rule index to service name
     service_names: Vec<String>,
-    /// Maps glob index to the original pattern (for explanation)
+    /// Maps rule index to the original pattern (for explanation)
     pub patterns: Vec<String>,
 }
 
@@ -62,6 +76,9 @@ impl ServiceMapper {
         let mut builder = GlobSetBuilder::new();
         let mut service_names = Vec::new();
         let mut patterns = Vec::new();
+        // Normalized glob -> glob index, so equivalent rules compile once.
+        let mut glob_index: HashMap<String, usize> = HashMap::new();
+        let mut glob_rules: Vec<Vec<usize>> = Vec::new();
 
         for (line_idx, line) in content.lines().enumerate() {
             let line = line.trim();
@@ -70,98 +87,255 @@ impl ServiceMapper {
             }
 
             // Format: "pattern    service"
-            let split_once: Vec<&str> = line.splitn(2, |c: char| c.is_whitespace()).collect();
-            if split_once.len() < 2 {
+            let Some((raw_pattern, rest)) = line.split_once(char::is_whitespace) else {
+                anyhow::bail!(
+                    "Invalid line {}: '{}' - expected 'pattern service'",
+                    line_idx + 1,
+                    line
+                );
+            };
+            let service = strip_inline_comment(rest).trim();
+            if service.is_empty() {
                 anyhow::bail!(
                     "Invalid line {}: '{}' - expected 'pattern service'",
                     line_idx + 1,
                     line
                 );
             }
-            let raw_pattern = split_once[0];
-            let service = split_once[1].trim();
 
             let glob_str = normalize_pattern(raw_pattern)?;
-            let glob = GlobBuilder::new(&glob_str)
-                .literal_separator(true) // match / as separator
-                .build()
-                .with_context(|| {
-                    format!(
-                        "Invalid glob pattern on line {}: {}",
-                        line_idx + 1,
-                        raw_pattern
-                    )
-                })?;
-
-            builder.add(glob);
+            let rule_idx = patterns.len();
+            match glob_index.get(&glob_str) {
+                Some(&g) => glob_rules[g].push(rule_idx),
+                None => {
+                    let glob = GlobBuilder::new(&glob_str)
+                        .literal_separator(true) // match / as separator
+                        .build()
+                        .with_context(|| {
+                            format!(
+                                "Invalid glob pattern on line {}: {}",
+                                line_idx + 1,
+                                raw_pattern
+                            )
+                        })?;
+                    builder.add(glob);
+                    glob_index.insert(glob_str, glob_rules.len());
+                    glob_rules.push(vec![rule_idx]);
+                }
+            }
             service_names.push(service.to_string());
             patterns.push(raw_pattern.to_string());
         }
 
         let glob_set = builder.build().context("Failed to build glob set")?;
+        let shared_globs = (glob_rules.len() < patterns.len()).then_some(glob_rules);
         Ok(Self {
             glob_set,
+            shared_globs,
             service_names,
             patterns,
         })
     }
 
     pub fn find_service(&self, path: &str) -> Option<&str> {
-        let matches = self.glob_set.matches(path);
-        matches
-            .iter()
-            .max()
-            .map(|idx| self.service_names[*idx].as_str())
+        self.find_service_into(path, &mut Vec::new())
+    }
+
+    /// Like `find_service`, but reuses `scratch` for the glob set's match
+    /// indices so bulk callers don't allocate per path.
+    fn find_service_into(&self, path: &str, scratch: &mut Vec<usize>) -> Option<&str> {
+        self.matching_rules_into(path, scratch);
+        // Indices come back sorted ascending; last match wins.
+        scratch.last().map(|idx| self.service_names[*idx].as_str())
+    }
+
+    /// Writes the index of every rule matching `path` into `into`, in
+    /// ascending (declaration) order.
+    ///
+    /// All rules are compiled into one `GlobSet`, which dispatches literal,
+    /// prefix, suffix and extension rules through hash/Aho-Corasick lookups
+    /// and the rest through a single regex set, so this is one pass over the
+    /// path no matter how many rules there are.
+    pub fn matching_rules_into(&self, path: &str, into: &mut Vec<usize>) {
+        self.glob_set.matches_into(path, into);
+        if let Some(glob_rules) = &self.shared_globs {
+            // Swap each matched glob for the rules behind it, in place.
+            let globs = into.len();
+            for i in 0..globs {
+                into.extend_from_slice(&glob_rules[into[i]]);
+            }
+            into.drain(..globs);
+            into.sort_unstable();
+        }
+    }
+
+    /// Service the rule at `rule` (an index from `matching_rules_into`)
+    /// assigns its files to.
+    pub fn rule_service(&self, rule: usize) -> &str {
+        &self.service_names[rule]
     }
 
     pub fn explain_service(&self, path: &str) -> Vec<ExplainMatch<'_>> {
-        let matches = self.glob_set.matches(path);
-        let mut result = Vec::new();
-        for idx in matches {
-            result.push(ExplainMatch {
+        let mut matches = Vec::new();
+        self.matching_rules_into(path, &mut matches);
+        matches
+            .into_iter()
+            .map(|idx| ExplainMatch {
                 service: &self.service_names[idx],
-                pattern: self.patterns[idx].clone(),
-            });
+                pattern: &self.patterns[idx],
+            })
+            .collect()
+    }
+}
+
+/// Changed files grouped by the service that owns them. Borrows service
+/// names from the mapper and paths from the input, so building a report
+/// copies no strings.
+#[derive(Debug, Default)]
+pub struct ImpactReport<'a> {
+    /// Maps service name to its changed files, in input order. Ordered by
+    /// service so renderers never need to collect and sort the keys.
+    pub services: BTreeMap<&'a str, Vec<&'a str>>,
+    /// Changed files no rule matched
+    pub unmapped_files: Vec<&'a str>,
+}
+
+/// Resolves every changed file against the mapper's compiled glob set, one
+/// scan per path, sharing a single match buffer across the whole batch.
+///
+/// `files` must not contain duplicates (git diff output never does); this is
+/// only checked in debug builds rather than paid for with a dedup pass.
+/// Nothing is re-sorted either: each service's files and `unmapped_files`
+/// keep the input order, so git's already-sorted output stays sorted.
+pub fn compute_impact<'a>(mapper: &'a ServiceMapper, files: &'a [String]) -> ImpactReport<'a> {
+    debug_assert_eq!(
+        files.iter().collect::<HashSet<_>>().len(),
+        files.len(),
+        "compute_impact expects unique paths"
+    );
+    let mut report = ImpactReport::default();
+    let mut scratch = Vec::new();
+    for file in files {
+        match mapper.find_service_into(file, &mut scratch) {
+            Some(svc) => {
+                report.services.entry(svc).or_default().push(file);
+            }
+            None => report.unmapped_files.push(file),
         }
-        result
     }
+    report
 }
 
-pub fn normalize_pattern(pat: &str) -> Result<String> {
-    // 1. strip
-    let mut s = pat.trim().to_string();
-    if s.is_empty() {
-        return Ok(s);
+/// A problem `lint --check-services` found between SERVICEOWNERS and
+/// services.yaml.
+#[derive(Debug, PartialEq, Eq)]
+pub enum ServiceIssue<'a> {
+    /// A rule assigns files to a service services.yaml doesn't define
+    Undefined(&'a str),
+    /// A defined service lists neither owners nor a contact
+    Unreachable(&'a str),
+}
+
+/// Cross-checks the mapper's services against services.yaml. Each undefined
+/// service is reported once, in rule order; unreachable services follow,
+/// sorted by name so the output doesn't depend on map order.
+pub fn check_services<'a>(
+    mapper: &'a ServiceMapper,
+    services: &'a ServicesFile,
+) -> Vec<ServiceIssue<'a>> {
+    let mut issues = Vec::new();
+    let mut reported = HashSet::new();
+    for svc in &mapper.service_names {
+        if !services.services.contains_key(svc) && reported.insert(svc.as_str()) {
+            issues.push(ServiceIssue::Undefined(svc));
+        }
     }
 
-    // 2. replace backslash
-    s = s.replace('\\', "/");
+    let mut unreachable: Vec<&str> = services
+        .services
+        .iter()
+        .filter(|(_, def)| {
+            let has_owners = def.owners.as_ref().is_some_and(|o| !o.is_empty());
+            let has_contact = def
+                .contact
+                .as_ref()
+                .is_some_and(|c| c.slack.is_some() || c.email.is_some());
+            !has_owners && !has_contact
+        })
+        .map(|(name, _)| name.as_str())
+        .collect();
+    unreachable.sort_unstable();
+    issues.extend(unreachable.into_iter().map(ServiceIssue::Unreachable));
+    issues
+}
 
-    // 3. strip leading ./
-    while s.starts_with("./") {
-        s = s[2..].to_string();
+/// Cuts a trailing `# comment` off the service column. A `#` only opens a
+/// comment at the start or after whitespace, so `team#2` stays intact.
+/// Slices the line in one scan; nothing is copied.
+fn strip_inline_comment(s: &str) -> &str {
+    let bytes = s.as_bytes();
+    match memchr::memchr_iter(b'#', bytes).find(|&i| i == 0 || bytes[i - 1].is_ascii_whitespace()) {
+        Some(i) => &s[..i],
+        None => s,
     }
+}
 
-    // 4. strip leading / (anchor to root is implied by 'contains slash' logic + absolute match)
-    if s.starts_with('/') {
-        s = s[1..].to_string();
+/// Normalizes a user-supplied path to the repo-relative form rules match
+/// against: backslashes become `/`, and surrounding whitespace, leading `./`
+/// segments and a leading `/` are dropped. Borrows the input unless it
+/// contains a backslash, in which case one converted copy is made.
+pub fn normalize_path(path: &str) -> Cow<'_, str> {
+    let p = path.trim();
+    if !p.contains('\\') {
+        return Cow::Borrowed(strip_root(p));
     }
+    let mut posix = p.replace('\\', "/");
+    let start = posix.len() - strip_root(&posix).len();
+    posix.drain(..start);
+    Cow::Owned(posix)
+}
 
-    // 5. trailing slash => /**
-    if s.ends_with('/') {
-        if s == "/" {
-            return Ok("**".to_string());
-        }
-        s.pop(); // remove /
-        s.push_str("/**");
+/// Slices leading `./` segments and a leading `/` off a `/`-separated path.
+fn strip_root(mut p: &str) -> &str {
+    while let Some(rest) = p.strip_prefix("./") {
+        p = rest;
     }
+    p.strip_prefix('/').unwrap_or(p)
+}
 
-    // 6. If no slash, prepend **/
-    if !s.contains('/') {
-        s = format!("**/{}", s);
+/// Turns a SERVICEOWNERS pattern into the glob it compiles to. Works on
+/// slices of the input and builds the result in one allocation (plus one
+/// more only when the pattern contains backslashes).
+pub fn normalize_pattern(pat: &str) -> Result<String> {
+    let trimmed = pat.trim();
+    if trimmed.is_empty() {
+        return Ok(String::new());
+    }
+    let posix = if trimmed.contains('\\') {
+        Cow::Owned(trimmed.replace('\\', "/"))
+    } else {
+        Cow::Borrowed(trimmed)
+    };
+
+    // Leading ./ and / are dropped: patterns are always rooted at the repo.
+    let s = strip_root(&posix);
+    if s == "/" {
+        return Ok("**".to_string());
     }
 
-    Ok(s)
+    let mut out = String::with_capacity(s.len() + 3);
+    if let Some(dir) = s.strip_suffix('/') {
+        // trailing slash => everything under the directory
+        out.push_str(dir);
+        out.push_str("/**");
+    } else {
+        // no slash => match the name at any depth
+        if !s.contains('/') {
+            out.push_str("**/");
+        }
+        out.push_str(s);
+    }
+    Ok(out)
 }
 
 /// Heuristics for Init command
@@ -178,46 +352,171 @@ pub fn init_from_codeowners(codeowners_path: &Path) -> Result<String> {
         if line.is_empty() || line.starts_with('#') {
             continue;
         }
-        let parts: Vec<&str> = line.split_whitespace().collect();
-        if parts.len() < 2 {
+        let mut parts = line.split_whitespace();
+        let (Some(pattern), Some(first_owner)) = (parts.next(), parts.next()) else {
             continue;
-        }
+        };
 
-        let pattern = parts[0];
-        let owners = &parts[1..];
-
-        let service = infer_service_name(pattern, owners);
-        out.push_str(&format!("{:<20} {}\n", pattern, service));
+        // Only the first owner feeds the name heuristic, so the rest of the
+        // line is never split out.
+        let service = infer_service_name(pattern, first_owner);
+        writeln!(out, "{:<20} {}", pattern, service)?;
     }
     Ok(out)
 }
 
-fn infer_service_name(pattern: &str, owners: &[&str]) -> String {
+fn infer_service_name(pattern: &str, first_owner: &str) -> String {
     let p = pattern.trim_start_matches('/').trim_end_matches('/');
-    let segments: Vec<&str> = p.split('/').collect();
+    // Last segment that isn't a wildcard or a generic container directory.
+    let last = p
+        .rsplit('/')
+        .find(|s| !matches!(*s, "*" | "**" | "src" | "lib" | "packages" | "apps"));
+
+    if let Some(last) = last {
+        if !last.is_empty() {
+            let mut name = String::with_capacity(last.len());
+            for c in last.chars() {
+                if c.is_alphanumeric() {
+                    name.extend(c.to_lowercase());
+                } else {
+                    name.push('_');
+                }
+            }
+            return name;
+        }
+    }
 
-    let candidates: Vec<&str> = segments
-        .iter()
-        .filter(|&&s| {
-            s != "*" && s != "**" && s != "src" && s != "lib" && s != "packages" && s != "apps"
-        })
-        .cloned()
-        .collect();
+    let o = first_owner.trim_start_matches('@');
+    if let Some((_, name)) = o.split_once('/') {
+        return name.replace('-', "_").to_lowercase();
+    }
+    o.replace('-', "_").to_lowercase()
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
 
-    if let Some(last) = candidates.last() {
-        let name = last.replace(|c: char| !c.is_alphanumeric(), "_");
-        if !name.is_empty() {
-            return name.to_lowercase();
+    fn service(owners: Option<Vec<Owner>>, contact: Option<Contact>) -> ServiceDef {
+        ServiceDef {
+            owners,
+            contact,
+            docs: None,
+            runbook: None,
         }
     }
 
-    if let Some(owner) = owners.first() {
-        let o = owner.trim_start_matches('@');
-        if let Some((_, name)) = o.split_once('/') {
-            return name.replace('-', "_").to_lowercase();
+    #[test]
+    fn check_services_reports_undefined_and_unreachable() {
+        let mapper =
+            ServiceMapper::parse("apps/api/** api\napps/web/** web\ninfra/** web\ndocs/** ghost\n")
+                .unwrap();
+        let team = Owner::Team {
+            team: "@org/api".to_string(),
+        };
+        let slack = Contact {
+            slack: Some("#web".to_string()),
+            email: None,
+        };
+        let services = ServicesFile {
+            services: HashMap::from([
+                ("api".to_string(), service(Some(vec![team]), None)),
+                ("web".to_string(), service(Some(vec![]), Some(slack))),
+                ("zed".to_string(), service(Some(vec![]), None)),
+                (
+                    "alpha".to_string(),
+                    service(
+                        None,
+                        Some(Contact {
+                            slack: None,
+                            email: None,
+                        }),
+                    ),
+                ),
+            ]),
+        };
+
+        assert_eq!(
+            check_services(&mapper, &services),
+            [
+                ServiceIssue::Undefined("ghost"),
+                ServiceIssue::Unreachable("alpha"),
+                ServiceIssue::Unreachable("zed"),
+            ]
+        );
+    }
+
+    #[test]
+    fn rules_sharing_a_glob_keep_declaration_order() {
+        let mapper = ServiceMapper::parse("docs/ docs\n*.md markdown\n./docs/ web\n").unwrap();
+        assert_eq!(mapper.find_service("docs/a.md"), Some("web"));
+
+        let mut rules = Vec::new();
+        mapper.matching_rules_into("docs/a.md", &mut rules);
+        assert_eq!(rules, [0, 1, 2]);
+
+        let explained: Vec<_> = mapper
+            .explain_service("docs/a.md")
+            .iter()
+            .map(|m| (m.pattern, m.service))
+            .collect();
+        assert_eq!(
+            explained,
+            [("docs/", "docs"), ("*.md", "markdown"), ("./docs/", "web")]
+        );
+
+        assert_eq!(mapper.find_service("notes.md"), Some("markdown"));
+        assert_eq!(mapper.find_service("src/main.rs"), None);
+    }
+
+    #[test]
+    fn normalize_pattern_edge_cases() {
+        let cases = [
+            ("", ""),
+            ("   ", ""),
+            ("/", "**/"),
+            ("//", "**"),
+            ("./", "**/"),
+            ("a/", "a/**"),
+            ("/a/b/", "a/b/**"),
+            ("././a/b", "a/b"),
+            ("Dockerfile", "**/Dockerfile"),
+            ("*.md", "**/*.md"),
+            (".\\x", "**/x"),
+            ("docs\\api\\", "docs/api/**"),
+            ("  /apps/**  ", "apps/**"),
+        ];
+        for (input, expected) in cases {
+            assert_eq!(normalize_pattern(input).unwrap(), expected, "{:?}", input);
         }
-        return o.replace('-', "_").to_lowercase();
     }
 
-    "unknown_service".to_string()
+    #[test]
+    fn inline_comments_are_stripped() {
+        assert_eq!(strip_inline_comment("api # note"), "api ");
+        assert_eq!(strip_inline_comment("api\t#note"), "api\t");
+        assert_eq!(strip_inline_comment("team#2"), "team#2");
+        assert_eq!(strip_inline_comment("team#2 # note"), "team#2 ");
+        assert_eq!(strip_inline_comment("#only"), "");
+        assert_eq!(strip_inline_comment("api"), "api");
+
+        let mapper = ServiceMapper::parse("apps/** api # note\nlib/** team#2\n").unwrap();
+        assert_eq!(mapper.find_service("apps/x"), Some("api"));
+        assert_eq!(mapper.find_service("lib/x"), Some("team#2"));
+        assert!(ServiceMapper::parse("apps/** #only\n").is_err());
+    }
+
+    #[test]
+    fn normalize_path_strips_root_and_converts_backslashes() {
+        assert_eq!(normalize_path("apps/api/main.py"), "apps/api/main.py");
+        assert_eq!(normalize_path("  ./apps/x  "), "apps/x");
+        assert_eq!(normalize_path("././apps/x"), "apps/x");
+        assert_eq!(normalize_path("/apps/x"), "apps/x");
+        assert_eq!(normalize_path(".\\apps\\web\\x.ts"), "apps/web/x.ts");
+        assert_eq!(normalize_path("\\docs\\a.md"), "docs/a.md");
+        assert_eq!(normalize_path(""), "");
+
+        assert!(matches!(normalize_path("./apps/x"), Cow::Borrowed(_)));
+        assert!(matches!(normalize_path("apps\\x"), Cow::Owned(_)));
+    }
 }
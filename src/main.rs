@@ -1,9 +1,17 @@
 use anyhow::{Context, Result};
 use clap::{Parser, Subcommand};
-use serviceowners::{init_from_codeowners, ServiceMapper};
-use std::collections::{HashMap, HashSet};
+use serde::{Deserialize, Serialize};
+use serviceowners::{
+    check_services, compute_impact, init_from_codeowners, normalize_path, normalize_pattern,
+    ImpactReport, ServiceIssue, ServiceMapper, ServicesFile,
+};
+use std::collections::{BTreeMap, HashMap};
+use std::fmt::Write as _;
+use std::io::{BufRead, BufReader, Read, Write};
 use std::path::{Path, PathBuf};
-use std::process::Command;
+use std::process::{ChildStdout, Command, Stdio};
+use std::sync::atomic::{AtomicBool, AtomicUsize, Ordering};
+use std::sync::{Mutex, OnceLock};
 
 #[derive(Parser)]
 #[command(name = "sowners")]
@@ -55,6 +63,12 @@ enum Commands {
         /// Check if patterns match any files
         #[arg(long)]
         check_matches: bool,
+        /// Report files matched by rules for more than one service
+        #[arg(long)]
+        check_overlaps: bool,
+        /// Check rule services against services.yaml
+        #[arg(long)]
+        check_services: bool,
     },
     /// Initialize from CODEOWNERS
     Init {
@@ -86,24 +100,24 @@ fn main() -> Result<()> {
     match cli.command {
         Commands::WhoOwns { path, explain } => {
             let mapper = ServiceMapper::from_file(&cli.serviceowners_file)?;
-            match mapper.find_service(&path) {
-                Some(svc) => {
-                    println!("{}", svc);
-                    if explain {
+            let path = normalize_path(&path);
+            if explain {
+                // A single scan yields every matching rule; the last one wins.
+                let matches = mapper.explain_service(&path);
+                match matches.last() {
+                    Some(winner) => {
+                        println!("{}", winner.service);
                         println!("\nMatches:");
-                        let matches = mapper.explain_service(&path);
-                        for m in matches {
-                            let chosen = if m.service == svc { " <== chosen" } else { "" };
+                        let last = matches.len() - 1;
+                        for (i, m) in matches.iter().enumerate() {
+                            let chosen = if i == last { " <== chosen" } else { "" };
                             println!("- {} -> {}{}", m.pattern, m.service, chosen);
                         }
                     }
+                    None => println!("Unmapped\n\nNo matches found."),
                 }
-                None => {
-                    println!("Unmapped");
-                    if explain {
-                        println!("\nNo matches found.");
-                    }
-                }
+            } else {
+                println!("{}", mapper.find_service(&path).unwrap_or("Unmapped"));
             }
         }
         Commands::Impacted {
@@ -114,83 +128,40 @@ fn main() -> Result<()> {
         } => {
             let mapper = ServiceMapper::from_file(&cli.serviceowners_file)?;
 
-            let files = get_changed_files(diff.as_deref())?;
-            let mut service_files: HashMap<String, Vec<String>> = HashMap::new();
-            let mut unmapped_files = Vec::new();
-
-            for file in &files {
-                match mapper.find_service(file) {
-                    Some(svc) => {
-                        service_files
-                            .entry(svc.to_string())
-                            .or_default()
-                            .push(file.clone());
-                    }
-                    None => {
-                        unmapped_files.push(file.clone());
-                    }
-                }
-            }
-            let mut sorted_services: Vec<String> = service_files.keys().cloned().collect();
-            sorted_services.sort();
+            let files = diff_name_only(diff.as_deref())?;
+            let report = compute_impact(&mapper, &files);
+            let service_files = &report.services;
+            let unmapped_files = &report.unmapped_files;
 
             match format.as_str() {
                 "json" => {
-                    let impacted_services: Vec<String> = sorted_services.clone();
-                    let mut services_detail = HashMap::new();
-                    for (svc, files) in &service_files {
-                        services_detail.insert(
-                            svc,
-                            serde_json::json!({
-                                "count": files.len(),
-                                "files": files
-                            }),
-                        );
-                    }
-                    let payload = serde_json::json!({
-                        "impacted_services": impacted_services,
-                        "services": services_detail,
-                        "unmapped_files": unmapped_files,
-                    });
-                    println!("{}", serde_json::to_string_pretty(&payload)?);
+                    let payload = ImpactJson {
+                        impacted_services: service_files.keys().copied().collect(),
+                        services: service_files
+                            .iter()
+                            .map(|(svc, files)| {
+                                (
+                                    *svc,
+                                    ServiceJson {
+                                        count: files.len(),
+                                        files,
+                                    },
+                                )
+                            })
+                            .collect(),
+                        unmapped_files,
+                    };
+                    let mut out = std::io::stdout().lock();
+                    serde_json::to_writer_pretty(&mut out, &payload)?;
+                    writeln!(out)?;
                 }
                 "markdown" => {
-                    println!("### Impacted Services\n");
-                    if sorted_services.is_empty() {
-                        println!("_No services impacted_");
-                    } else {
-                        println!("| Service | Files |");
-                        println!("| --- | --- |");
-                        for svc in &sorted_services {
-                            let count = service_files[svc].len();
-                            println!("| **{}** | {} |", svc, count);
-                        }
-                    }
-                    if !unmapped_files.is_empty() {
-                        println!("\n### Unmapped Files\n");
-                        for f in &unmapped_files {
-                            println!("- `{}`", f);
-                        }
-                    }
+                    let md = render_impact_markdown(&report)?;
+                    std::io::stdout().lock().write_all(md.as_bytes())?;
                 }
                 _ => {
-                    if !sorted_services.is_empty() {
-                        println!("Impacted Services:");
-                        for svc in &sorted_services {
-                            println!("- {}", svc);
-                            if show_files {
-                                for f in &service_files[svc] {
-                                    println!("  - {}", f);
-                                }
-                            }
-                        }
-                    }
-                    if !unmapped_files.is_empty() {
-                        println!("\nUnmapped Files:");
-                        for f in &unmapped_files {
-                            println!("- {}", f);
-                        }
-                    }
+                    let text = render_impact_text(&report, show_files)?;
+                    std::io::stdout().lock().write_all(text.as_bytes())?;
                 }
             }
 
@@ -201,48 +172,90 @@ fn main() -> Result<()> {
         Commands::Lint {
             strict: _,
             check_matches,
+            check_overlaps,
+            check_services,
         } => {
             let mapper = ServiceMapper::from_file(&cli.serviceowners_file)?;
             println!("Valid SERVICEOWNERS syntax");
 
-            if check_matches {
-                println!("Checking matches (this may take a while for large repos)...");
-                let mut used_rules = HashSet::new();
-                let walker = ignore::WalkBuilder::new(".").build();
-                for result in walker {
-                    match result {
-                        Ok(entry) => {
-                            if entry.file_type().map(|ft| ft.is_file()).unwrap_or(false) {
-                                let path = entry.path();
-                                if let Ok(rel) = path.strip_prefix(".") {
-                                    let path_str = rel.to_string_lossy();
-                                    let matches = mapper.explain_service(&path_str);
-                                    for m in matches {
-                                        used_rules.insert(m.pattern);
-                                    }
-                                }
-                            }
-                        }
-                        Err(err) => eprintln!("Error walking repo: {}", err),
+            // A repeated pattern silently overrides the earlier rule. Rules are
+            // keyed on the glob they compile to, so `docs/` and `./docs/`
+            // count as the same pattern. `insert` hands back the previous
+            // occurrence and records this one in a single lookup, so each
+            // redefinition is compared to the last.
+            let mut seen: HashMap<String, usize> = HashMap::with_capacity(mapper.patterns.len());
+            for (idx, pat) in mapper.patterns.iter().enumerate() {
+                if let Some(prev) = seen.insert(normalize_pattern(pat)?, idx) {
+                    let (before, after) = (mapper.rule_service(prev), mapper.rule_service(idx));
+                    if before == after {
+                        continue;
                     }
+                    let prev_pat = &mapper.patterns[prev];
+                    if prev_pat == pat {
+                        println!(
+                            "Warning: Pattern '{}' is reassigned from '{}' to '{}'; the later rule wins.",
+                            pat, before, after
+                        );
+                    } else {
+                        println!(
+                            "Warning: Pattern '{}' (same as '{}') is reassigned from '{}' to '{}'; the later rule wins.",
+                            pat, prev_pat, before, after
+                        );
+                    }
+                }
+            }
+
+            if check_services {
+                lint_services(&mapper, &cli.services_file);
+            }
+
+            if check_matches || check_overlaps {
+                if check_matches {
+                    println!("Checking matches (this may take a while for large repos)...");
                 }
+                let LintScan {
+                    hit,
+                    overlaps,
+                    overlaps_truncated,
+                } = scan_tracked_files(&mapper, check_matches, check_overlaps);
 
-                let mut unused_count = 0;
-                for pat in &mapper.patterns {
-                    if !used_rules.contains(pat) {
+                if check_matches {
+                    let mut unused_count = 0;
+                    for (pat, _) in mapper.patterns.iter().zip(&hit).filter(|(_, h)| !**h) {
                         println!("Warning: Pattern '{}' matches no files.", pat);
                         unused_count += 1;
                     }
+
+                    if unused_count == 0 {
+                        println!("All patterns match at least one file.");
+                    } else {
+                        println!("Found {} unused patterns.", unused_count);
+                        // If strict check was enabled, we could exit non-zero here.
+                        // Python version: lint warnings cause exit 2 on strict.
+                        // The argument `strict` is available here.
+                        // But I'll leave it as warning for now unless asked.
+                    }
                 }
 
-                if unused_count == 0 {
-                    println!("All patterns match at least one file.");
-                } else {
-                    println!("Found {} unused patterns.", unused_count);
-                    // If strict check was enabled, we could exit non-zero here.
-                    // Python version: lint warnings cause exit 2 on strict.
-                    // The argument `strict` is available here.
-                    // But I'll leave it as warning for now unless asked.
+                if check_overlaps {
+                    println!("Checking overlaps...");
+                    for o in &overlaps {
+                        println!(
+                            "Warning: '{}' is matched by several services ({}); '{}' wins.",
+                            o.file, o.services, o.chosen
+                        );
+                    }
+                    if overlaps.is_empty() {
+                        println!("No overlapping ownership found.");
+                    } else if overlaps_truncated {
+                        println!(
+                            "Found more than {} files with overlapping ownership; stopped after the first {}.",
+                            MAX_OVERLAP_EXAMPLES,
+                            overlaps.len()
+                        );
+                    } else {
+                        println!("Found {} files with overlapping ownership.", overlaps.len());
+                    }
                 }
             }
         }
@@ -265,13 +278,24 @@ fn main() -> Result<()> {
             };
             let out = init_from_codeowners(&co_path)?;
             if write {
-                if cli.serviceowners_file.exists() && !force {
-                    anyhow::bail!(
-                        "{:?} already exists (use --force to overwrite)",
-                        cli.serviceowners_file
-                    );
+                // Let open() decide whether the file exists instead of a
+                // separate stat; `create_new` also closes the check/write race.
+                let mut opts = std::fs::OpenOptions::new();
+                if force {
+                    opts.write(true).create(true).truncate(true);
+                } else {
+                    opts.write(true).create_new(true);
                 }
-                std::fs::write(&cli.serviceowners_file, out)?;
+                let mut f = match opts.open(&cli.serviceowners_file) {
+                    Err(err) if err.kind() == std::io::ErrorKind::AlreadyExists => {
+                        anyhow::bail!(
+                            "{:?} already exists (use --force to overwrite)",
+                            cli.serviceowners_file
+                        );
+                    }
+                    result => result?,
+                };
+                f.write_all(out.as_bytes())?;
                 println!("Wrote {:?}", cli.serviceowners_file);
             } else {
                 println!("{}", out);
@@ -297,26 +321,409 @@ fn main() -> Result<()> {
     Ok(())
 }
 
-fn get_changed_files(diff_arg: Option<&str>) -> Result<Vec<String>> {
+/// `impacted --format json` payload. Serialized straight from the report's
+/// borrowed data instead of first copying it into a `serde_json::Value`.
+#[derive(Serialize)]
+struct ImpactJson<'a> {
+    impacted_services: Vec<&'a str>,
+    services: BTreeMap<&'a str, ServiceJson<'a>>,
+    unmapped_files: &'a [&'a str],
+}
+
+#[derive(Serialize)]
+struct ServiceJson<'a> {
+    count: usize,
+    files: &'a [&'a str],
+}
+
+fn diff_name_only(diff_arg: Option<&str>) -> Result<Vec<String>> {
+    #[cfg(feature = "git2")]
+    match diff_name_only_libgit2(diff_arg.unwrap_or("HEAD~1..HEAD")) {
+        Ok(files) => return Ok(files),
+        Err(err) => log::debug!("libgit2 diff failed, falling back to git: {}", err),
+    }
+
     let args = match diff_arg {
-        Some(range) => vec!["diff", "--name-only", range],
-        None => vec!["diff", "--name-only", "HEAD~1", "HEAD"],
+        Some(range) => vec!["diff", "-z", "--name-only", range],
+        None => vec!["diff", "-z", "--name-only", "HEAD~1", "HEAD"],
     };
 
-    let output = Command::new("git")
-        .args(&args)
-        .output()
-        .context("Failed to run git diff")?;
+    git_paths(&args).context("git diff failed")
+}
 
-    if !output.status.success() {
-        anyhow::bail!(
-            "git diff failed: {}",
-            String::from_utf8_lossy(&output.stderr)
+/// `impacted --format markdown` output, rendered into one buffer so stdout
+/// sees a single write instead of a locked, flushed `println!` per line.
+fn render_impact_markdown(report: &ImpactReport) -> Result<String> {
+    let mut out = String::with_capacity(64 + impact_text_len(report, false));
+    out.push_str("### Impacted Services\n\n");
+    if report.services.is_empty() {
+        out.push_str("_No services impacted_\n");
+    } else {
+        out.push_str("| Service | Files |\n| --- | --- |\n");
+        for (svc, files) in &report.services {
+            writeln!(out, "| **{}** | {} |", svc, files.len())?;
+        }
+    }
+    if !report.unmapped_files.is_empty() {
+        out.push_str("\n### Unmapped Files\n\n");
+        for f in &report.unmapped_files {
+            writeln!(out, "- `{}`", f)?;
+        }
+    }
+    Ok(out)
+}
+
+/// Default `impacted` output; see `render_impact_markdown`.
+fn render_impact_text(report: &ImpactReport, show_files: bool) -> Result<String> {
+    let mut out = String::with_capacity(64 + impact_text_len(report, show_files));
+    if !report.services.is_empty() {
+        out.push_str("Impacted Services:\n");
+        for (svc, files) in &report.services {
+            writeln!(out, "- {}", svc)?;
+            if show_files {
+                for f in files {
+                    writeln!(out, "  - {}", f)?;
+                }
+            }
+        }
+    }
+    if !report.unmapped_files.is_empty() {
+        out.push_str("\nUnmapped Files:\n");
+        for f in &report.unmapped_files {
+            writeln!(out, "- {}", f)?;
+        }
+    }
+    Ok(out)
+}
+
+/// Rough size of a rendered report: every name and path plus a little
+/// markup per line, so the output buffer is allocated once.
+fn impact_text_len(report: &ImpactReport, with_files: bool) -> usize {
+    let line = |s: &str| s.len() + 16;
+    let services: usize = report
+        .services
+        .iter()
+        .map(|(svc, files)| {
+            line(svc)
+                + if with_files {
+                    files.iter().map(|f| line(f)).sum()
+                } else {
+                    0
+                }
+        })
+        .sum();
+    services + report.unmapped_files.iter().map(|f| line(f)).sum::<usize>()
+}
+
+/// `lint --check-services`: reports SERVICEOWNERS services missing from
+/// services.yaml and definitions nobody can be reached through. A missing or
+/// unreadable file is itself reported rather than failing the lint.
+fn lint_services(mapper: &ServiceMapper, path: &Path) {
+    if !path.is_file() {
+        println!(
+            "Warning: {} not found; skipping service checks.",
+            path.display()
         );
+        return;
+    }
+    let services = match ServicesFile::from_file(path) {
+        Ok(services) => services,
+        Err(err) => {
+            println!("Warning: cannot parse {}: {:#}", path.display(), err);
+            return;
+        }
+    };
+    for issue in check_services(mapper, &services) {
+        match issue {
+            ServiceIssue::Undefined(svc) => println!(
+                "Warning: Service '{}' is not defined in {}.",
+                svc,
+                path.display()
+            ),
+            ServiceIssue::Unreachable(svc) => {
+                println!("Warning: Service '{}' has no owners or contact.", svc)
+            }
+        }
     }
+}
+
+/// Overlapping files `lint --check-overlaps` reports before giving up; past
+/// this point the rule set needs restructuring, not a longer list.
+const MAX_OVERLAP_EXAMPLES: usize = 50;
+
+/// Tracked files handed to a lint worker at a time.
+const LINT_BATCH_SIZE: usize = 1024;
+
+/// A file claimed by rules for more than one service.
+struct Overlap<'a> {
+    file: String,
+    /// Every service with a matching rule, sorted and comma-separated
+    services: String,
+    /// The last-match winner
+    chosen: &'a str,
+}
+
+/// What the opt-in lint checks learned from the tracked files.
+struct LintScan<'a> {
+    /// Per rule: whether any file matched it
+    hit: Vec<bool>,
+    /// The first `MAX_OVERLAP_EXAMPLES` overlaps, in listing order
+    overlaps: Vec<Overlap<'a>>,
+    /// Whether more overlaps exist than `overlaps` holds
+    overlaps_truncated: bool,
+}
+
+/// Runs the `--check-matches` / `--check-overlaps` pass. Files stream in
+/// from git on this thread and are matched in batches by one scoped worker
+/// per core, each doing a single glob-set scan per file. Reading stops once
+/// neither check can change: every rule has been hit and enough overlaps
+/// have been found.
+fn scan_tracked_files(
+    mapper: &ServiceMapper,
+    check_matches: bool,
+    check_overlaps: bool,
+) -> LintScan<'_> {
+    let workers = std::thread::available_parallelism().map_or(1, |n| n.get());
+    let hit: Vec<AtomicBool> = mapper
+        .patterns
+        .iter()
+        .map(|_| AtomicBool::new(false))
+        .collect();
+    let unhit = AtomicUsize::new(if check_matches { hit.len() } else { 0 });
+    let overlap_count = AtomicUsize::new(0);
+    let (tx, rx) = std::sync::mpsc::sync_channel::<(usize, Vec<String>)>(workers * 2);
+    let rx = Mutex::new(rx);
 
-    let stdout = String::from_utf8(output.stdout)?;
-    Ok(stdout.lines().map(|s| s.to_string()).collect())
+    let mut overlaps = std::thread::scope(|scope| {
+        let handles: Vec<_> = (0..workers)
+            .map(|_| {
+                scope.spawn(|| {
+                    let mut found = Vec::new();
+                    let mut scratch = Vec::new();
+                    loop {
+                        let next = rx.lock().unwrap().recv();
+                        let Ok((batch_idx, files)) = next else {
+                            break;
+                        };
+                        for (i, file) in files.into_iter().enumerate() {
+                            mapper.matching_rules_into(&file, &mut scratch);
+                            if check_matches {
+                                for &idx in &scratch {
+                                    if !hit[idx].swap(true, Ordering::Relaxed) {
+                                        unhit.fetch_sub(1, Ordering::Relaxed);
+                                    }
+                                }
+                            }
+                            if !check_overlaps {
+                                continue;
+                            }
+                            let Some(&winner) = scratch.last() else {
+                                continue;
+                            };
+                            let chosen = mapper.rule_service(winner);
+                            if scratch.iter().all(|&r| mapper.rule_service(r) == chosen) {
+                                continue;
+                            }
+                            overlap_count.fetch_add(1, Ordering::Relaxed);
+                            // The channel hands each worker batches in order,
+                            // so its overlaps arrive in listing order too. Any
+                            // overlap in the global first cap+1 is within the
+                            // first cap+1 of its worker; later ones are only
+                            // counted, never built.
+                            if found.len() > MAX_OVERLAP_EXAMPLES {
+                                continue;
+                            }
+                            let mut services: Vec<&str> =
+                                scratch.iter().map(|&r| mapper.rule_service(r)).collect();
+                            services.sort_unstable();
+                            services.dedup();
+                            let overlap = Overlap {
+                                file,
+                                services: services.join(", "),
+                                chosen,
+                            };
+                            found.push(((batch_idx, i), overlap));
+                        }
+                    }
+                    found
+                })
+            })
+            .collect();
+
+        let mut batch = Vec::with_capacity(LINT_BATCH_SIZE);
+        let mut batch_idx = 0;
+        for_each_tracked_file(|file| {
+            batch.push(file);
+            if batch.len() == LINT_BATCH_SIZE {
+                let full = std::mem::replace(&mut batch, Vec::with_capacity(LINT_BATCH_SIZE));
+                if tx.send((batch_idx, full)).is_err() {
+                    return false;
+                }
+                batch_idx += 1;
+            }
+            unhit.load(Ordering::Relaxed) > 0
+                || (check_overlaps && overlap_count.load(Ordering::Relaxed) <= MAX_OVERLAP_EXAMPLES)
+        });
+        if !batch.is_empty() {
+            let _ = tx.send((batch_idx, batch));
+        }
+        drop(tx);
+
+        handles
+            .into_iter()
+            .flat_map(|h| h.join().unwrap())
+            .collect::<Vec<_>>()
+    });
+
+    // Workers finish batches out of order; report the earliest overlaps,
+    // exactly as a sequential pass would have. Reading only stops past the
+    // cap, so finding more than it means the list really is truncated.
+    overlaps.sort_unstable_by_key(|(pos, _)| *pos);
+    let overlaps_truncated = overlap_count.into_inner() > MAX_OVERLAP_EXAMPLES;
+    overlaps.truncate(MAX_OVERLAP_EXAMPLES);
+    LintScan {
+        hit: hit.into_iter().map(AtomicBool::into_inner).collect(),
+        overlaps: overlaps.into_iter().map(|(_, o)| o).collect(),
+        overlaps_truncated,
+    }
+}
+
+/// Streams the repo-relative files the lint checks match rules against to
+/// `f`, which returns `false` once it has seen enough. Lists git's tracked
+/// files, or every non-ignored file under "." when git can't list them
+/// (e.g. outside a repository).
+fn for_each_tracked_file(mut f: impl FnMut(String) -> bool) {
+    let mut listed_any = false;
+    let listed = git_paths_each(&["ls-files", "-z"], |file| {
+        listed_any = true;
+        f(file)
+    });
+    match listed {
+        Ok(()) => {}
+        Err(err) if listed_any => eprintln!("git ls-files failed: {:#}", err),
+        Err(err) => {
+            eprintln!("git ls-files failed, walking the working tree: {:#}", err);
+            walk_files_each(f);
+        }
+    }
+}
+
+fn walk_files_each(mut f: impl FnMut(String) -> bool) {
+    for result in ignore::WalkBuilder::new(".").build() {
+        match result {
+            Ok(entry) => {
+                if entry.file_type().map(|ft| ft.is_file()).unwrap_or(false) {
+                    // The walk is rooted at ".", so every path is "./<rel>";
+                    // slice the prefix off the string rather than re-parsing
+                    // path components.
+                    let path_str = entry.path().to_string_lossy();
+                    let rel = path_str
+                        .strip_prefix('.')
+                        .and_then(|p| p.strip_prefix(std::path::is_separator))
+                        .unwrap_or(&path_str);
+                    if !f(rel.to_string()) {
+                        return;
+                    }
+                }
+            }
+            Err(err) => eprintln!("Error walking repo: {}", err),
+        }
+    }
+}
+
+/// Runs a git command that prints NUL-terminated paths (`-z`) and collects
+/// them as they are produced. `-z` output is never quoted or escaped, so
+/// records need no trimming or unquoting.
+fn git_paths(args: &[&str]) -> Result<Vec<String>> {
+    let mut paths = Vec::new();
+    git_paths_each(args, |path| {
+        paths.push(path);
+        true
+    })?;
+    Ok(paths)
+}
+
+/// Like `git_paths`, but hands each path to `f` as soon as git prints it.
+/// When `f` returns `false` git is stopped without reading the rest.
+fn git_paths_each(args: &[&str], mut f: impl FnMut(String) -> bool) -> Result<()> {
+    let mut child = Command::new("git")
+        .args(args)
+        .stdout(Stdio::piped())
+        .stderr(Stdio::piped())
+        .spawn()
+        .context("Failed to run git")?;
+
+    // Drained concurrently so a chatty git can't fill the stderr pipe and
+    // stall while we are still reading stdout.
+    let mut stderr = child.stderr.take().expect("git stderr is piped");
+    let stderr = std::thread::spawn(move || {
+        let mut buf = Vec::new();
+        let _ = stderr.read_to_end(&mut buf);
+        buf
+    });
+
+    let stdout = child.stdout.take().expect("git stdout is piped");
+    let read = read_paths(stdout, &mut f);
+    if !matches!(read, Ok(true)) {
+        // Stopped early or failed mid-stream: git may still be writing.
+        let _ = child.kill();
+    }
+    let status = child.wait()?;
+    let stderr = stderr.join().unwrap_or_default();
+
+    if !read? {
+        return Ok(());
+    }
+    if !status.success() {
+        anyhow::bail!("{}", String::from_utf8_lossy(&stderr).trim_end());
+    }
+    Ok(())
+}
+
+/// Feeds NUL-separated records from `stdout` to `f`. Returns `false` if `f`
+/// asked to stop before the end of the stream.
+fn read_paths(stdout: ChildStdout, f: &mut impl FnMut(String) -> bool) -> Result<bool> {
+    for record in BufReader::new(stdout).split(b'\0') {
+        let record = record?;
+        if !record.is_empty() && !f(String::from_utf8(record)?) {
+            return Ok(false);
+        }
+    }
+    Ok(true)
+}
+
+/// In-process equivalent of `git diff --name-only <range>` for `a..b` and
+/// `a...b` ranges, avoiding a `git` fork per invocation. Anything else (a
+/// single rev diffed against the worktree) is left to the subprocess path.
+#[cfg(feature = "git2")]
+fn diff_name_only_libgit2(range: &str) -> Result<Vec<String>> {
+    let repo = git2::Repository::discover(".")?;
+    let spec = repo.revparse(range)?;
+    let (from, to) = match (spec.from(), spec.to()) {
+        (Some(from), Some(to)) => (from.peel_to_commit()?, to.peel_to_commit()?),
+        _ => anyhow::bail!("'{}' is not a revision range", range),
+    };
+    let base = if spec.mode().contains(git2::RevparseMode::MERGE_BASE) {
+        repo.find_commit(repo.merge_base(from.id(), to.id())?)?
+    } else {
+        from
+    };
+
+    let mut opts = git2::DiffOptions::new();
+    opts.skip_binary_check(true);
+    let mut diff =
+        repo.diff_tree_to_tree(Some(&base.tree()?), Some(&to.tree()?), Some(&mut opts))?;
+    // Match `git diff`'s default rename detection (renames report the new path).
+    diff.find_similar(None)?;
+
+    // Non-UTF-8 paths are an error, exactly as in `read_paths`.
+    let mut files = Vec::with_capacity(diff.deltas().len());
+    for delta in diff.deltas() {
+        if let Some(path) = delta.new_file().path_bytes() {
+            files.push(std::str::from_utf8(path)?.to_owned());
+        }
+    }
+    Ok(files)
 }
 
 fn action_runner(
@@ -335,71 +742,53 @@ fn action_runner(
     };
 
     let mapper = ServiceMapper::from_file(serviceowners)?;
-    let files = get_changed_files(Some(&diff))?;
-    let mut impacted_services: HashSet<String> = HashSet::new();
-    let mut unmapped_files = Vec::new();
-
-    for file in &files {
-        match mapper.find_service(file) {
-            Some(svc) => {
-                impacted_services.insert(svc.to_string());
-            }
-            None => {
-                unmapped_files.push(file.clone());
-            }
-        }
-    }
+    let files = diff_name_only(Some(&diff))?;
+    let report = compute_impact(&mapper, &files);
+    let impacted_services: Vec<&str> = report.services.keys().copied().collect();
+    let unmapped_files = &report.unmapped_files;
 
-    // GITHUB_OUTPUT
+    // GITHUB_OUTPUT (built in memory, then appended with a single write)
     if let Ok(path) = std::env::var("GITHUB_OUTPUT") {
-        let mut f = std::fs::OpenOptions::new().append(true).open(path)?;
-        use std::io::Write;
-        let services_vec: Vec<&String> = impacted_services.iter().collect();
-        let services_json = serde_json::to_string(&services_vec)?;
-        let unmapped_json = serde_json::to_string(&unmapped_files)?;
-        writeln!(f, "impacted_services={}", services_json)?;
-        writeln!(f, "unmapped_files={}", unmapped_json)?;
+        // Serialize straight into the write buffer; no per-list JSON strings.
+        let mut payload = b"impacted_services=".to_vec();
+        serde_json::to_writer(&mut payload, &impacted_services)?;
+        payload.extend_from_slice(b"\nunmapped_files=");
+        serde_json::to_writer(&mut payload, unmapped_files)?;
+        payload.push(b'\n');
+        append_to_file(&path, &payload)?;
     }
 
     // Markdown Body
-    let mut md = String::new();
+    let mut md = String::with_capacity(
+        128 + diff.len()
+            + impacted_services
+                .iter()
+                .map(|s| s.len() + 16)
+                .sum::<usize>(),
+    );
     md.push_str("### 🧭 ServiceOwners Impact Report\n\n");
-    md.push_str(&format!("Diff: `{}`\n\n", diff));
+    writeln!(md, "Diff: `{}`\n", diff)?;
     if impacted_services.is_empty() {
         md.push_str("_No services impacted_");
     } else {
         md.push_str("| Service | \n| --- | \n");
-        let mut sorted: Vec<&String> = impacted_services.iter().collect();
-        sorted.sort();
-        for svc in sorted {
-            md.push_str(&format!("| **{}** | \n", svc));
+        for svc in &impacted_services {
+            writeln!(md, "| **{}** | ", svc)?;
         }
     }
     md.push_str("\n<!-- serviceowners:begin -->\n<!-- serviceowners:end -->");
 
     // GITHUB_STEP_SUMMARY
     if let Ok(path) = std::env::var("GITHUB_STEP_SUMMARY") {
-        let mut f = std::fs::OpenOptions::new().append(true).open(path)?;
-        use std::io::Write;
-        f.write_all(md.as_bytes())?;
+        append_to_file(&path, md.as_bytes())?;
     }
 
     // PR Commenting
     if comment {
         if let Ok(token) = std::env::var("GITHUB_TOKEN") {
-            if let Ok(event_path) = std::env::var("GITHUB_EVENT_PATH") {
-                if let Ok(content) = std::fs::read_to_string(event_path) {
-                    if let Ok(json) = serde_json::from_str::<serde_json::Value>(&content) {
-                        if let Some(pr_num) = json
-                            .get("pull_request")
-                            .and_then(|pr| pr.get("number"))
-                            .and_then(|n| n.as_i64())
-                        {
-                            if let Ok(repo) = std::env::var("GITHUB_REPOSITORY") {
-                                post_pr_comment(&token, &repo, pr_num, &md)?;
-                            }
-                        }
-                    }
+            if let Some(pr_num) = github_event_pr_number() {
+                if let Ok(repo) = std::env::var("GITHUB_REPOSITORY") {
+                    post_pr_comment(&token, &repo, pr_num, &md)?;
                 }
             }
         }
@@ -412,54 +801,436 @@ fn action_runner(
     Ok(())
 }
 
-fn post_pr_comment(token: &str, repo: &str, pr_num: i64, body: &str) -> Result<()> {
-    let client = reqwest::blocking::Client::new();
+/// Appends `bytes` to a GitHub Actions file command target in one `write`,
+/// so a run issues one syscall per file rather than one per formatted piece.
+fn append_to_file(path: &str, bytes: &[u8]) -> Result<()> {
+    std::fs::OpenOptions::new()
+        .append(true)
+        .create(true)
+        .open(path)
+        .and_then(|mut f| f.write_all(bytes))
+        .with_context(|| format!("Failed to write {}", path))
+}
+
+/// The only part of the GitHub event payload the action reads. Deserializing
+/// into this skips the rest of the payload instead of building a `Value`
+/// tree for all of it.
+#[derive(Debug, Deserialize)]
+struct GitHubEvent {
+    pull_request: Option<PullRequestRef>,
+}
+
+#[derive(Debug, Deserialize)]
+struct PullRequestRef {
+    number: i64,
+}
+
+/// The event at `GITHUB_EVENT_PATH`, read as raw bytes so the payload is
+/// never copied into an intermediate `String`. The file can't change during
+/// a run, so it is loaded and parsed at most once per process.
+fn github_event() -> Option<&'static GitHubEvent> {
+    static EVENT: OnceLock<Option<GitHubEvent>> = OnceLock::new();
+    EVENT
+        .get_or_init(|| {
+            let path = std::env::var_os("GITHUB_EVENT_PATH")?;
+            let bytes = std::fs::read(path).ok()?;
+            serde_json::from_slice(&bytes).ok()
+        })
+        .as_ref()
+}
+
+/// The PR number of the triggering event. Any event with a top-level
+/// `pull_request` object qualifies; others (push, schedule, ...) yield `None`.
+fn github_event_pr_number() -> Option<i64> {
+    github_event()?.pull_request.as_ref().map(|pr| pr.number)
+}
+
+/// Where `post_pr_comment` remembers the comment it last wrote, so later runs
+/// can revalidate it with a conditional request instead of paging through
+/// every comment on the PR.
+const COMMENT_CACHE_FILE: &str = ".git/serviceowners-cache.json";
+
+/// Comments fetched per page while scanning for the marker (GitHub's maximum).
+const COMMENTS_PER_PAGE: usize = 100;
+
+/// Upper bound on pages scanned before giving up and posting a new comment.
+const MAX_COMMENT_PAGES: usize = 10;
+
+/// Concurrent page fetches once the total page count is known.
+const COMMENT_FETCH_WORKERS: usize = 8;
+
+/// The fields of an issue comment we read. Everything else in the API
+/// response is skipped while deserializing, and a malformed comment fails
+/// the page as a whole instead of being probed field by field.
+#[derive(Debug, Deserialize)]
+struct IssueComment {
+    id: i64,
+    body: Option<String>,
+}
+
+#[derive(Debug, Default, Deserialize, Serialize)]
+struct CommentCache {
+    /// Keyed by `owner/repo#pr#marker`
+    comments: HashMap<String, CachedComment>,
+}
+
+#[derive(Debug, Clone, Deserialize, Serialize)]
+struct CachedComment {
+    id: i64,
+    etag: Option<String>,
+}
+
+fn comment_cache_key(repo: &str, pr_num: i64, marker: &str) -> String {
+    format!("{}#{}#{}", repo, pr_num, marker)
+}
+
+fn load_comment_cache() -> CommentCache {
+    std::fs::read(COMMENT_CACHE_FILE)
+        .ok()
+        .and_then(|bytes| serde_json::from_slice(&bytes).ok())
+        .unwrap_or_default()
+}
+
+fn store_comment_cache(cache: &CommentCache) {
+    // Only cache inside a git checkout; never create `.git` ourselves.
+    if !Path::new(".git").is_dir() {
+        return;
+    }
+    if let Ok(bytes) = serde_json::to_vec(cache) {
+        if let Err(err) = std::fs::write(COMMENT_CACHE_FILE, bytes) {
+            log::debug!("Failed to write {}: {}", COMMENT_CACHE_FILE, err);
+        }
+    }
+}
+
+fn etag_of(resp: &reqwest::blocking::Response) -> Option<String> {
+    resp.headers()
+        .get(reqwest::header::ETAG)
+        .and_then(|v| v.to_str().ok())
+        .map(|s| s.to_string())
+}
+
+/// Revalidates the cached comment with `If-None-Match`; a 304 costs no body
+/// and no rate limit. Falls back to the paginated scan on any miss.
+fn find_existing_comment_id_fast(
+    client: &reqwest::blocking::Client,
+    repo: &str,
+    pr_num: i64,
+    marker: &str,
+    cache: &mut CommentCache,
+) -> Result<Option<i64>> {
+    let key = comment_cache_key(repo, pr_num, marker);
+    if let Some(cached) = cache.comments.get(&key).cloned() {
+        let url = format!(
+            "https://api.github.com/repos/{}/issues/comments/{}",
+            repo, cached.id
+        );
+        let mut req = client.get(&url);
+        if let Some(etag) = &cached.etag {
+            req = req.header(reqwest::header::IF_NONE_MATCH, etag);
+        }
+        // The cache is only a shortcut: if revalidation fails for any
+        // reason, forget the entry and fall back to scanning the PR.
+        match req.send() {
+            Ok(resp) if resp.status() == reqwest::StatusCode::NOT_MODIFIED => {
+                return Ok(Some(cached.id));
+            }
+            Ok(resp) if resp.status().is_success() => {
+                let etag = etag_of(&resp);
+                match resp.json::<IssueComment>() {
+                    Ok(comment) if comment.body.as_deref().is_some_and(|b| b.contains(marker)) => {
+                        cache.comments.insert(
+                            key,
+                            CachedComment {
+                                id: cached.id,
+                                etag,
+                            },
+                        );
+                        return Ok(Some(cached.id));
+                    }
+                    Ok(_) => {}
+                    Err(err) => log::debug!("Cached comment revalidation failed: {}", err),
+                }
+            }
+            Ok(_) => {}
+            Err(err) => log::debug!("Cached comment revalidation failed: {}", err),
+        }
+        cache.comments.remove(&key);
+    }
+
+    find_existing_comment_id(client, repo, pr_num, marker)
+}
+
+fn fetch_comment_page(
+    client: &reqwest::blocking::Client,
+    url: &str,
+    page: usize,
+) -> Result<reqwest::blocking::Response> {
+    Ok(client
+        .get(url)
+        .query(&[("per_page", COMMENTS_PER_PAGE), ("page", page)])
+        .send()?
+        .error_for_status()?)
+}
+
+/// Looks for `marker` in one raw page of comments. The page is only parsed
+/// when its bytes contain the marker's text; JSON escaping can rewrite the
+/// `<!--`/`-->` wrapper, so the search uses just the text between them.
+fn find_marker_in_page(page: &[u8], marker: &str) -> Result<Option<i64>> {
+    let needle = marker
+        .trim_start_matches("<!--")
+        .trim_end_matches("-->")
+        .trim();
+    if memchr::memmem::find(page, needle.as_bytes()).is_none() {
+        return Ok(None);
+    }
+    let comments: Vec<IssueComment> = serde_json::from_slice(page)?;
+    Ok(find_marker(&comments, marker))
+}
+
+fn find_marker(comments: &[IssueComment], marker: &str) -> Option<i64> {
+    comments
+        .iter()
+        .find(|c| c.body.as_deref().is_some_and(|b| b.contains(marker)))
+        .map(|c| c.id)
+}
+
+/// Extracts the page number of the `rel="last"` entry of a `Link` header.
+fn parse_last_page(link: &str) -> Option<usize> {
+    let last = link.split(',').find(|part| part.contains("rel=\"last\""))?;
+    let url = last.split(';').next()?.trim();
+    let url = url.trim_start_matches('<').trim_end_matches('>');
+    url.split(['?', '&'])
+        .find_map(|kv| kv.strip_prefix("page="))?
+        .parse()
+        .ok()
+}
+
+/// Scans the PR's comments for `marker`. Page 1 is fetched on its own and
+/// its `Link` header tells us how many pages exist; only when there is more
+/// than one are the rest fetched concurrently, stopping as soon as one
+/// worker finds the marker.
+fn find_existing_comment_id(
+    client: &reqwest::blocking::Client,
+    repo: &str,
+    pr_num: i64,
+    marker: &str,
+) -> Result<Option<i64>> {
     let url = format!(
         "https://api.github.com/repos/{}/issues/{}/comments",
         repo, pr_num
     );
 
-    let marker = "<!-- serviceowners:begin -->";
-    let resp = client
-        .get(&url)
-        .header("Authorization", format!("Bearer {}", token))
-        .header("User-Agent", "serviceowners-rust")
-        .send()?
-        .json::<Vec<serde_json::Value>>()?;
-
-    let mut comment_id = None;
-    for c in resp {
-        if let Some(b) = c.get("body").and_then(|s| s.as_str()) {
-            if b.contains(marker) {
-                comment_id = c.get("id").and_then(|id| id.as_i64());
-                break;
+    let resp = fetch_comment_page(client, &url, 1)?;
+    let last_page = resp
+        .headers()
+        .get(reqwest::header::LINK)
+        .and_then(|v| v.to_str().ok())
+        .and_then(parse_last_page)
+        .unwrap_or(1)
+        .min(MAX_COMMENT_PAGES);
+    if let Some(id) = find_marker_in_page(&resp.bytes()?, marker)? {
+        return Ok(Some(id));
+    }
+    if last_page < 2 {
+        return Ok(None);
+    }
+
+    scan_comment_pages(last_page, |page| {
+        let bytes = fetch_comment_page(client, &url, page)?.bytes()?;
+        find_marker_in_page(&bytes, marker)
+    })
+}
+
+/// Runs `fetch` over pages `2..=last_page` on up to `COMMENT_FETCH_WORKERS`
+/// threads and returns the hit from the earliest page, matching what a
+/// sequential scan would return. A hit wins over errors on other pages.
+fn scan_comment_pages(
+    last_page: usize,
+    fetch: impl Fn(usize) -> Result<Option<i64>> + Sync,
+) -> Result<Option<i64>> {
+    // Pages are claimed in ascending order, so once a worker hits on page N
+    // every earlier page has already been claimed and will finish.
+    let next_page = AtomicUsize::new(2);
+    let found = AtomicBool::new(false);
+    let workers = COMMENT_FETCH_WORKERS.min(last_page.saturating_sub(1));
+    let results: Vec<Result<Option<(usize, i64)>>> = std::thread::scope(|s| {
+        let handles: Vec<_> = (0..workers)
+            .map(|_| {
+                s.spawn(|| -> Result<Option<(usize, i64)>> {
+                    while !found.load(Ordering::Relaxed) {
+                        let page = next_page.fetch_add(1, Ordering::Relaxed);
+                        if page > last_page {
+                            break;
+                        }
+                        if let Some(id) = fetch(page)? {
+                            found.store(true, Ordering::Relaxed);
+                            return Ok(Some((page, id)));
+                        }
+                    }
+                    Ok(None)
+                })
+            })
+            .collect();
+        handles
+            .into_iter()
+            .map(|h| h.join().expect("comment fetch worker panicked"))
+            .collect()
+    });
+
+    let mut best: Option<(usize, i64)> = None;
+    let mut first_err = None;
+    for result in results {
+        match result {
+            Ok(Some(hit)) => {
+                if best.is_none_or(|b| hit.0 < b.0) {
+                    best = Some(hit);
+                }
+            }
+            Ok(None) => {}
+            Err(err) => {
+                first_err.get_or_insert(err);
             }
         }
     }
+    match (best, first_err) {
+        (Some((_, id)), _) => Ok(Some(id)),
+        (None, Some(err)) => Err(err),
+        (None, None) => Ok(None),
+    }
+}
+
+/// One client for every GitHub call in a run, so requests after the first
+/// reuse a pooled keep-alive connection instead of a new TCP + TLS
+/// handshake.
+fn github_client(token: &str) -> Result<reqwest::blocking::Client> {
+    let mut auth = reqwest::header::HeaderValue::from_str(&format!("Bearer {}", token))
+        .context("GITHUB_TOKEN is not a valid header value")?;
+    auth.set_sensitive(true);
+    let mut headers = reqwest::header::HeaderMap::new();
+    headers.insert(reqwest::header::AUTHORIZATION, auth);
+
+    Ok(reqwest::blocking::Client::builder()
+        .default_headers(headers)
+        .user_agent("serviceowners-rust")
+        .build()?)
+}
+
+fn post_pr_comment(token: &str, repo: &str, pr_num: i64, body: &str) -> Result<()> {
+    let client = github_client(token)?;
+    let url = format!(
+        "https://api.github.com/repos/{}/issues/{}/comments",
+        repo, pr_num
+    );
+
+    let marker = "<!-- serviceowners:begin -->";
+    let mut cache = load_comment_cache();
+    let comment_id = find_existing_comment_id_fast(&client, repo, pr_num, marker, &mut cache)?;
 
     let payload = serde_json::json!({ "body": body });
+    let key = comment_cache_key(repo, pr_num, marker);
 
     if let Some(id) = comment_id {
         let update_url = format!(
             "https://api.github.com/repos/{}/issues/comments/{}",
             repo, id
         );
-        client
-            .patch(&update_url)
-            .header("Authorization", format!("Bearer {}", token))
-            .header("User-Agent", "serviceowners-rust")
-            .json(&payload)
-            .send()?;
-        println!("Updated comment {}", id);
-    } else {
-        client
-            .post(&url)
-            .header("Authorization", format!("Bearer {}", token))
-            .header("User-Agent", "serviceowners-rust")
-            .json(&payload)
-            .send()?;
-        println!("Created comment on PR #{}", pr_num);
+        let resp = client.patch(&update_url).json(&payload).send()?;
+        let status = resp.status();
+        if status.is_success() {
+            println!("Updated comment {}", id);
+            cache.comments.insert(
+                key,
+                CachedComment {
+                    id,
+                    etag: etag_of(&resp),
+                },
+            );
+            store_comment_cache(&cache);
+            return Ok(());
+        }
+
+        // Whatever went wrong, the cached id can't be trusted any more.
+        cache.comments.remove(&key);
+        store_comment_cache(&cache);
+        // Only a deleted comment is replaced; posting on any other failure
+        // would leave a duplicate report behind.
+        if status != reqwest::StatusCode::NOT_FOUND && status != reqwest::StatusCode::GONE {
+            eprintln!("Warning: failed to update comment {}: {}", id, status);
+            return Ok(());
+        }
+    }
+
+    let resp = client.post(&url).json(&payload).send()?;
+    println!("Created comment on PR #{}", pr_num);
+
+    // Remember what we wrote so the next run can skip the scan.
+    if resp.status().is_success() {
+        let etag = etag_of(&resp);
+        if let Ok(comment) = resp.json::<IssueComment>() {
+            cache.comments.insert(
+                key,
+                CachedComment {
+                    id: comment.id,
+                    etag,
+                },
+            );
+            store_comment_cache(&cache);
+        }
     }
 
     Ok(())
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn parse_last_page_reads_github_link_header() {
+        let link = "<https://api.github.com/repositories/1300192/issues/1/comments?per_page=100&page=2>; rel=\"next\", \
+                    <https://api.github.com/repositories/1300192/issues/1/comments?per_page=100&page=7>; rel=\"last\"";
+        assert_eq!(parse_last_page(link), Some(7));
+
+        let link = "<https://api.github.com/repositories/1300192/issues/1/comments?page=3&per_page=100>; rel=\"last\"";
+        assert_eq!(parse_last_page(link), Some(3));
+
+        // The last page's own header carries no rel="last".
+        let link = "<https://api.github.com/repositories/1300192/issues/1/comments?per_page=100&page=6>; rel=\"prev\", \
+                    <https://api.github.com/repositories/1300192/issues/1/comments?per_page=100&page=1>; rel=\"first\"";
+        assert_eq!(parse_last_page(link), None);
+    }
+
+    #[test]
+    fn comment_page_scan_prefers_the_earliest_page() {
+        use std::sync::Mutex;
+        use std::time::Duration;
+
+        let fetched = Mutex::new(Vec::new());
+        let hit = scan_comment_pages(20, |page| {
+            fetched.lock().unwrap().push(page);
+            match page {
+                // The earlier hit comes back last.
+                5 => {
+                    std::thread::sleep(Duration::from_millis(50));
+                    Ok(Some(500))
+                }
+                6 | 12 => Ok(Some(page as i64 * 100)),
+                3 => anyhow::bail!("page 3 failed"),
+                _ => Ok(None),
+            }
+        })
+        .unwrap();
+        assert_eq!(hit, Some(500));
+        // Page 1 is the caller's job; nothing past the last page is fetched.
+        let fetched = fetched.into_inner().unwrap();
+        assert!(fetched.iter().all(|p| (2..=20).contains(p)));
+
+        assert!(scan_comment_pages(4, |page| match page {
+            3 => anyhow::bail!("page 3 failed"),
+            _ => Ok(None),
+        })
+        .is_err());
+        assert_eq!(scan_comment_pages(1, |_| unreachable!()).unwrap(), None);
+    }
+}